@@ -1,15 +1,14 @@
 from . import server
-import asyncio
 import sys
+import traceback
 
 def main():
     """Main entry point for the package."""
     try:
-        asyncio.run(server.main())
+        server.run_event_loop(server.main())
     except KeyboardInterrupt:
         print("Server stopped by user.", file=sys.stderr)
     except Exception as e:
-        import traceback
         print(f"Error running server: {str(e)}", file=sys.stderr)
         print(traceback.format_exc(), file=sys.stderr)
         sys.exit(1)
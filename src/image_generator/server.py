@@ -1,23 +1,35 @@
 import asyncio
 import base64
+import hashlib
 import io
+import json
 import os
+import sqlite3
 import sys
+import threading
+import time
+import traceback
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
+from types import MappingProxyType
 from typing import Dict, List, Optional
 
-import aiofiles
+import httpx
 import replicate
 from dotenv import load_dotenv
 from mcp.server.models import InitializationOptions
 import mcp.types as types
 from mcp.server import NotificationOptions, Server
 from pydantic import AnyUrl, Field
-from PIL import Image
 import mcp.server.stdio
 
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -26,30 +38,426 @@ if not os.getenv("REPLICATE_API_TOKEN"):
     print("WARNING: REPLICATE_API_TOKEN environment variable is not set.")
     print("Please set it to use the image generation functionality.")
 
+def _positive_int_env(name: str, default: int) -> int:
+    """
+    Read a positive integer setting from the environment.
+    Missing values use the default; invalid ones are reported and replaced by it.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        parsed = int(value)
+    except ValueError:
+        parsed = 0
+    if parsed < 1:
+        print(f"WARNING: {name} must be a positive integer, got {value!r}. Using {default}.", file=sys.stderr)
+        return default
+    return parsed
+
 # Create images directory if it doesn't exist
 IMAGES_DIR = Path("generated_images")
 IMAGES_DIR.mkdir(exist_ok=True)
 
-# Store generated images metadata
+# Store generated images metadata, mirrored from IMAGES_DB_PATH
 images: Dict[str, Dict] = {}
 
+# Persistent store of saved image metadata
+IMAGES_DB_PATH = IMAGES_DIR / "images.db"
+
+# Replicate model used for image generation
+SDXL_MODEL = "stability-ai/sdxl:c221b2b8ef527988fb59bf24a8b97c4561f1c671f73bd389f866bfb27c061316"
+
+# Version recorded alongside cached Replicate outputs
+SERVER_VERSION = "0.1.0"
+
+# Persistent cache of Replicate outputs, keyed by a hash of the model input
+CACHE_DB_PATH = IMAGES_DIR / "replicate_cache.db"
+
+# Upper bound on the image bytes kept in the cache; oldest entries go first
+REPLICATE_CACHE_MAX_BYTES = _positive_int_env("REPLICATE_CACHE_MAX_MB", 512) * 1024 * 1024
+
+# Maximum number of Replicate predictions running at once
+REPLICATE_MAX_CONCURRENCY = _positive_int_env("REPLICATE_MAX_CONCURRENCY", 4)
+_replicate_sem = asyncio.Semaphore(REPLICATE_MAX_CONCURRENCY)
+
+# Chunk size used when streaming downloaded images to disk
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Shared HTTP client so image downloads reuse pooled connections
+_http_client = httpx.AsyncClient(timeout=60, follow_redirects=True)
+
+# Number of recently generated images whose bytes are kept in memory
+URL_BYTES_CACHE_SIZE = 32
+
+# Recently generated image bytes by URL, least recently used first
+_url_bytes_cache: OrderedDict[str, bytes] = OrderedDict()
+
+# Background downloads of freshly generated images, by URL
+_prefetch_tasks: Dict[str, asyncio.Task] = {}
+
+def _open_cache() -> sqlite3.Connection:
+    """
+    Open the Replicate output cache, creating its table on first use.
+    """
+    conn = sqlite3.connect(CACHE_DB_PATH, check_same_thread=False)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS replicate_outputs (
+            key TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            image BLOB NOT NULL,
+            model TEXT NOT NULL,
+            server_version TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS replicate_outputs_url ON replicate_outputs (url)")
+    conn.commit()
+    return conn
+
+# The connection is shared across worker threads, so access is serialized
+_cache_conn = _open_cache()
+_cache_lock = threading.Lock()
+
+def replicate_cache_key(model_input: dict) -> str:
+    """
+    Build the cache key (and global ID) for a Replicate model input.
+    """
+    payload = json.dumps({"model": SDXL_MODEL, "input": model_input}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def _cache_lookup(key: str) -> Optional[tuple[str, bytes]]:
+    """
+    Return the cached image URL and bytes for a cache key, if any.
+    """
+    with _cache_lock:
+        row = _cache_conn.execute(
+            "SELECT url, image FROM replicate_outputs WHERE key = ?", (key,)
+        ).fetchone()
+    return (row[0], row[1]) if row else None
+
+def _cache_lookup_image(image_url: str) -> Optional[bytes]:
+    """
+    Return the cached image bytes previously downloaded from a URL, if any.
+    """
+    with _cache_lock:
+        row = _cache_conn.execute(
+            "SELECT image FROM replicate_outputs WHERE url = ?", (image_url,)
+        ).fetchone()
+    return row[0] if row else None
+
+def _cache_store(key: str, image_url: str, image: bytes) -> None:
+    """
+    Store a Replicate output together with its metadata envelope.
+    The oldest entries are evicted once the cache exceeds REPLICATE_CACHE_MAX_BYTES.
+    """
+    # An image larger than the whole cache would only evict everything else
+    if len(image) > REPLICATE_CACHE_MAX_BYTES:
+        print(f"Not caching {image_url}: {len(image)} bytes exceeds the cache limit", file=sys.stderr)
+        return
+    with _cache_lock:
+        _cache_conn.execute(
+            "INSERT OR REPLACE INTO replicate_outputs VALUES (?, ?, ?, ?, ?, ?)",
+            (key, image_url, image, SDXL_MODEL, SERVER_VERSION, datetime.now().isoformat()),
+        )
+        # rowid follows insertion order, so keep the newest entries that fit
+        _cache_conn.execute(
+            """
+            DELETE FROM replicate_outputs WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, SUM(length(image)) OVER (ORDER BY rowid DESC) AS total
+                    FROM replicate_outputs
+                )
+                WHERE total > ?
+            )
+            """,
+            (REPLICATE_CACHE_MAX_BYTES,),
+        )
+        _cache_conn.commit()
+
+def _remember_image_bytes(image_url: str, image: bytes) -> None:
+    """
+    Keep downloaded image bytes in memory, evicting the least recently used.
+    """
+    _url_bytes_cache[image_url] = image
+    _url_bytes_cache.move_to_end(image_url)
+    while len(_url_bytes_cache) > URL_BYTES_CACHE_SIZE:
+        _url_bytes_cache.popitem(last=False)
+
+async def _cache_replicate_output(key: Optional[str], image_url: str) -> None:
+    """
+    Download a freshly generated image and keep its bytes for save-image.
+    With a cache key the output is also added to the persistent Replicate cache.
+    Failures are logged and otherwise ignored, since caching is best effort.
+    """
+    try:
+        response = await _http_client.get(image_url)
+        if response.status_code != 200:
+            print(f"Not caching image, download returned status {response.status_code}", file=sys.stderr)
+            return
+        _remember_image_bytes(image_url, response.content)
+        if key is not None:
+            await asyncio.to_thread(_cache_store, key, image_url, response.content)
+            print(f"Cached Replicate output under key: {key}", file=sys.stderr)
+    except Exception as e:
+        print(f"Error caching Replicate output: {str(e)}", file=sys.stderr)
+
+def _prefetch_replicate_output(key: Optional[str], image_url: str) -> None:
+    """
+    Start caching a freshly generated image in the background.
+    """
+    task = asyncio.create_task(_cache_replicate_output(key, image_url))
+    _prefetch_tasks[image_url] = task
+    task.add_done_callback(lambda _: _prefetch_tasks.pop(image_url, None))
+
+async def _get_cached_image(image_url: str) -> Optional[bytes]:
+    """
+    Return previously downloaded bytes for an image URL, if any.
+    A background download still in flight for the URL is waited for first.
+    """
+    pending = _prefetch_tasks.get(image_url)
+    if pending is not None:
+        await asyncio.shield(pending)
+
+    image = _url_bytes_cache.get(image_url)
+    if image is not None:
+        _url_bytes_cache.move_to_end(image_url)
+        return image
+    return await asyncio.to_thread(_cache_lookup_image, image_url)
+
+def _open_images_db() -> sqlite3.Connection:
+    """
+    Open the saved image metadata store, creating its table on first use.
+    """
+    conn = sqlite3.connect(IMAGES_DB_PATH, check_same_thread=False)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS images (
+            id TEXT PRIMARY KEY,
+            prompt TEXT NOT NULL,
+            url TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            custom_directory TEXT,
+            custom_filename TEXT
+        )
+        """
+    )
+    conn.commit()
+    return conn
+
+_images_conn = _open_images_db()
+_images_lock = threading.Lock()
+
+def _format_created_at(created_at_ns: int) -> str:
+    """
+    Render a creation time in nanoseconds as a local ISO 8601 string.
+    """
+    return datetime.fromtimestamp(created_at_ns / 1_000_000_000).isoformat()
+
+def _image_path(image_id: str, metadata: Dict) -> Path:
+    """
+    Determine where a saved image lives based on its metadata.
+    """
+    if "custom_directory" in metadata:
+        save_dir = Path(metadata["custom_directory"])
+    else:
+        save_dir = IMAGES_DIR
+
+    if "custom_filename" in metadata:
+        filename = f"{metadata['custom_filename']}.png"
+    else:
+        filename = f"{image_id}.png"
+
+    return save_dir / filename
+
+def _load_images() -> Dict[str, Dict]:
+    """
+    Load the metadata of every saved image, oldest first.
+    """
+    with _images_lock:
+        rows = _images_conn.execute(
+            "SELECT id, prompt, url, created_at, custom_directory, custom_filename"
+            " FROM images ORDER BY created_at"
+        ).fetchall()
+
+    loaded = {}
+    for image_id, prompt, url, created_at, custom_directory, custom_filename in rows:
+        metadata = {
+            "id": image_id,
+            "prompt": prompt,
+            "url": url,
+            "created_at": created_at,
+        }
+        if custom_directory is not None:
+            metadata["custom_directory"] = custom_directory
+        if custom_filename is not None:
+            metadata["custom_filename"] = custom_filename
+        metadata["abs_path"] = str(_image_path(image_id, metadata).absolute())
+        loaded[image_id] = metadata
+    return loaded
+
+def _persist_image(metadata: Dict) -> None:
+    """
+    Write the metadata of a saved image to the persistent store.
+    """
+    with _images_lock:
+        _images_conn.execute(
+            "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                metadata["id"],
+                metadata["prompt"],
+                metadata["url"],
+                metadata["created_at"],
+                metadata.get("custom_directory"),
+                metadata.get("custom_filename"),
+            ),
+        )
+        _images_conn.commit()
+
+def _build_resource(image_id: str, metadata: Dict) -> types.Resource:
+    """
+    Build the MCP resource describing a saved image.
+    """
+    return types.Resource(
+        uri=AnyUrl(f"image://internal/{image_id}"),
+        name=f"Image: {metadata.get('prompt', 'Untitled')}",
+        description=f"Generated on {_format_created_at(metadata['created_at'])}",
+        mimeType="image/png",
+    )
+
+# Resource model per image, built on the first listing after the image is added
+_resource_models: Dict[str, types.Resource] = {}
+
+# Restore images saved by previous runs
+images.update(_load_images())
+
 server = Server("image-generator")
 
+def _temp_path_for(path: Path) -> Path:
+    """
+    Pick a unique hidden sibling of path to write into before moving it into place.
+    """
+    return path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+
+def _open_for_write(path: Path) -> int:
+    """
+    Create a new file for writing with a raw descriptor.
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    return os.open(path, flags, 0o644)
+
+def _write_all(fd: int, data: bytes) -> None:
+    """
+    Write all of data to a raw descriptor, bypassing Python-level buffering.
+    """
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+def _read_bytes(path: str) -> bytes:
+    """
+    Read a whole file in one pass, raising FileNotFoundError if it is missing.
+    """
+    with open(path, "rb") as f:
+        return f.read()
+
+def _discard_partial(fd: int, temp_path: Path) -> None:
+    """
+    Close and remove an unfinished temporary file.
+    """
+    os.close(fd)
+    temp_path.unlink(missing_ok=True)
+
+def _finish_write(fd: int, temp_path: Path, path: Path) -> None:
+    """
+    Close a completed temporary file and atomically move it onto path.
+    """
+    os.close(fd)
+    try:
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+
+def _write_bytes(path: Path, data: bytes) -> None:
+    """
+    Write data to a file in one unbuffered pass.
+    The data goes to a temporary file first, so path is never left half written.
+    """
+    temp_path = _temp_path_for(path)
+    fd = _open_for_write(temp_path)
+    try:
+        _write_all(fd, data)
+    except BaseException:
+        _discard_partial(fd, temp_path)
+        raise
+    _finish_write(fd, temp_path, path)
+
+async def _download_image(image_url: str, image_path: Path) -> int:
+    """
+    Stream an image from a URL to disk without blocking the event loop.
+    The download goes to a temporary file that replaces image_path only once
+    complete, so a failed download leaves any existing file untouched.
+    The status code is returned.
+    """
+    async with _http_client.stream("GET", image_url) as response:
+        if response.status_code != 200:
+            return response.status_code
+
+        # Opened inline: a single cheap syscall, and cancellation cannot leak it
+        temp_path = _temp_path_for(image_path)
+        fd = _open_for_write(temp_path)
+        write = None
+        try:
+            async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                # Shielded so a cancelled save never closes fd under a running write
+                write = asyncio.ensure_future(asyncio.to_thread(_write_all, fd, chunk))
+                await asyncio.shield(write)
+        except BaseException:
+            if write is not None and not write.done():
+                def discard_after_write(task: asyncio.Future) -> None:
+                    if not task.cancelled():
+                        task.exception()
+                    _discard_partial(fd, temp_path)
+                write.add_done_callback(discard_after_write)
+            else:
+                _discard_partial(fd, temp_path)
+            raise
+        await asyncio.shield(asyncio.ensure_future(
+            asyncio.to_thread(_finish_write, fd, temp_path, image_path)
+        ))
+        return response.status_code
+
+def _list_dir_names(directory: str) -> set[str]:
+    """
+    Return the names of the entries in a directory, or an empty set if it is missing.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries}
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+
+# Resource list built from images; reset to None whenever images changes
+_resources_cache: Optional[list[types.Resource]] = None
+
 @server.list_resources()
 async def handle_list_resources() -> list[types.Resource]:
     """
     List available image resources.
     Each image is exposed as a resource with a custom image:// URI scheme.
     """
-    return [
-        types.Resource(
-            uri=AnyUrl(f"image://internal/{image_id}"),
-            name=f"Image: {metadata.get('prompt', 'Untitled')}",
-            description=f"Generated on {metadata.get('created_at')}",
-            mimeType="image/png",
-        )
-        for image_id, metadata in images.items()
-    ]
+    global _resources_cache
+    if _resources_cache is None:
+        # Models, and the date formatting inside them, are built lazily so
+        # save-image only records the integer timestamp
+        for image_id, metadata in images.items():
+            if image_id not in _resource_models:
+                _resource_models[image_id] = _build_resource(image_id, metadata)
+        _resources_cache = [_resource_models[image_id] for image_id in images]
+    return _resources_cache
 
 @server.read_resource()
 async def handle_read_resource(uri: AnyUrl) -> bytes:
@@ -64,31 +472,48 @@ async def handle_read_resource(uri: AnyUrl) -> bytes:
     if image_id is not None:
         image_id = image_id.lstrip("/")
         if image_id in images:
-            image_path = IMAGES_DIR / f"{image_id}.png"
-            if image_path.exists():
-                async with aiofiles.open(image_path, "rb") as f:
-                    return await f.read()
+            try:
+                # One threadpool hop for the whole open/read/close
+                return await asyncio.to_thread(_read_bytes, images[image_id]["abs_path"])
+            except FileNotFoundError:
+                pass
     
     raise ValueError(f"Image not found: {image_id}")
 
+# Prompts never change, so the list is built once at import
+_PROMPT_LIST: list[types.Prompt] = [
+    types.Prompt(
+        name="generate-image",
+        description="Generate an image using Replicate's Stable Diffusion model",
+        arguments=[
+            types.PromptArgument(
+                name="style",
+                description="Style of the image (realistic/artistic/abstract)",
+                required=False,
+            )
+        ],
+    )
+]
+
 @server.list_prompts()
 async def handle_list_prompts() -> list[types.Prompt]:
     """
     List available prompts for image generation.
     """
-    return [
-        types.Prompt(
-            name="generate-image",
-            description="Generate an image using Replicate's Stable Diffusion model",
-            arguments=[
-                types.PromptArgument(
-                    name="style",
-                    description="Style of the image (realistic/artistic/abstract)",
-                    required=False,
-                )
-            ],
-        )
-    ]
+    return _PROMPT_LIST
+
+# Base prompt text, used on its own for unknown styles
+_BASE_PROMPT_TEXT = "Describe the image you want to generate. "
+
+# Full prompt text per style, formatted once at import
+_STYLE_PROMPTS = MappingProxyType({
+    style: _BASE_PROMPT_TEXT + style_prompt
+    for style, style_prompt in {
+        "realistic": "Create a photorealistic image with high detail and natural lighting.",
+        "artistic": "Create an artistic image in the style of a painting with vibrant colors and expressive brushstrokes.",
+        "abstract": "Create an abstract image with geometric shapes, bold colors, and non-representational forms.",
+    }.items()
+})
 
 @server.get_prompt()
 async def handle_get_prompt(
@@ -101,14 +526,7 @@ async def handle_get_prompt(
         raise ValueError(f"Unknown prompt: {name}")
 
     style = (arguments or {}).get("style", "realistic")
-    style_prompt = ""
-    
-    if style == "realistic":
-        style_prompt = "Create a photorealistic image with high detail and natural lighting."
-    elif style == "artistic":
-        style_prompt = "Create an artistic image in the style of a painting with vibrant colors and expressive brushstrokes."
-    elif style == "abstract":
-        style_prompt = "Create an abstract image with geometric shapes, bold colors, and non-representational forms."
+    prompt_text = _STYLE_PROMPTS.get(style, _BASE_PROMPT_TEXT)
 
     return types.GetPromptResult(
         description="Generate an image using Stable Diffusion",
@@ -117,57 +535,61 @@ async def handle_get_prompt(
                 role="user",
                 content=types.TextContent(
                     type="text",
-                    text=f"Describe the image you want to generate. {style_prompt}",
+                    text=prompt_text,
                 ),
             )
         ],
     )
 
+# Tools never change, so the list is built once at import
+_TOOL_LIST: list[types.Tool] = [
+    types.Tool(
+        name="generate-image",
+        description="Generate an image using Replicate's Stable Diffusion model",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "prompt": {"type": "string"},
+                "negative_prompt": {"type": "string"},
+                "width": {"type": "integer", "default": 768},
+                "height": {"type": "integer", "default": 768},
+                "num_inference_steps": {"type": "integer", "default": 50},
+                "guidance_scale": {"type": "number", "default": 7.5},
+                "seed": {"type": "integer", "description": "Random seed. Seeded requests with identical inputs are served from the local cache; without a seed every call generates a new image."},
+            },
+            "required": ["prompt"],
+        },
+    ),
+    types.Tool(
+        name="save-image",
+        description="Save a generated image",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "image_url": {"type": "string"},
+                "prompt": {"type": "string"},
+                "target_directory": {"type": "string", "description": "Directory path where the image should be saved. If not provided, defaults to the MCP server's images directory."},
+                "custom_filename": {"type": "string", "description": "Custom filename for the saved image (without extension). If not provided, a UUID will be used."},
+            },
+            "required": ["image_url", "prompt"],
+        },
+    ),
+    types.Tool(
+        name="list-saved-images",
+        description="List all saved images",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+        },
+    ),
+]
+
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
     """
     List available tools for image generation and management.
     """
-    return [
-        types.Tool(
-            name="generate-image",
-            description="Generate an image using Replicate's Stable Diffusion model",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "prompt": {"type": "string"},
-                    "negative_prompt": {"type": "string"},
-                    "width": {"type": "integer", "default": 768},
-                    "height": {"type": "integer", "default": 768},
-                    "num_inference_steps": {"type": "integer", "default": 50},
-                    "guidance_scale": {"type": "number", "default": 7.5},
-                },
-                "required": ["prompt"],
-            },
-        ),
-        types.Tool(
-            name="save-image",
-            description="Save a generated image",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "image_url": {"type": "string"},
-                    "prompt": {"type": "string"},
-                    "target_directory": {"type": "string", "description": "Directory path where the image should be saved. If not provided, defaults to the MCP server's images directory."},
-                    "custom_filename": {"type": "string", "description": "Custom filename for the saved image (without extension). If not provided, a UUID will be used."},
-                },
-                "required": ["image_url", "prompt"],
-            },
-        ),
-        types.Tool(
-            name="list-saved-images",
-            description="List all saved images",
-            inputSchema={
-                "type": "object",
-                "properties": {},
-            },
-        ),
-    ]
+    return _TOOL_LIST
 
 @server.call_tool()
 async def handle_call_tool(
@@ -176,6 +598,7 @@ async def handle_call_tool(
     """
     Handle tool execution requests for image generation and management.
     """
+    global _resources_cache
     if name == "generate-image":
         if not arguments:
             raise ValueError("Missing arguments")
@@ -189,24 +612,60 @@ async def handle_call_tool(
         height = int(arguments.get("height", 768))
         num_inference_steps = int(arguments.get("num_inference_steps", 50))
         guidance_scale = float(arguments.get("guidance_scale", 7.5))
+        seed = arguments.get("seed")
+
+        model_input = {
+            "prompt": prompt,
+            "negative_prompt": negative_prompt,
+            "width": width,
+            "height": height,
+            "num_inference_steps": num_inference_steps,
+            "guidance_scale": guidance_scale,
+        }
+        if seed is not None:
+            model_input["seed"] = int(seed)
 
         # Use Replicate's Stable Diffusion model to generate an image
         try:
             # Log the request
             print(f"Generating image with prompt: {prompt}", file=sys.stderr)
             
-            # Call the Replicate API
-            output = replicate.run(
-                "stability-ai/sdxl:c221b2b8ef527988fb59bf24a8b97c4561f1c671f73bd389f866bfb27c061316",
-                input={
-                    "prompt": prompt,
-                    "negative_prompt": negative_prompt,
-                    "width": width,
-                    "height": height,
-                    "num_inference_steps": num_inference_steps,
-                    "guidance_scale": guidance_scale,
-                }
-            )
+            # Only seeded requests are reproducible, so only they use the cache;
+            # without a seed every call asks Replicate for a new variation
+            cache_key = replicate_cache_key(model_input) if seed is not None else None
+            cached = None
+            if cache_key is not None:
+                cached = await asyncio.to_thread(_cache_lookup, cache_key)
+            if cached is not None:
+                cached_url, cached_image = cached
+                print(f"Using cached Replicate output for key: {cache_key}", file=sys.stderr)
+                
+                # The Replicate URL has likely expired, so return the stored bytes;
+                # save-image still accepts the URL and reads the bytes from the cache
+                return [
+                    types.TextContent(
+                        type="text",
+                        text="Image loaded from the local cache (an earlier request used the same inputs and seed). Use the save-image tool to save it permanently.",
+                    ),
+                    types.ImageContent(
+                        type="image",
+                        data=base64.b64encode(cached_image).decode("ascii"),
+                        mimeType="image/png",
+                    ),
+                    types.TextContent(
+                        type="text",
+                        text=f"Cached image URL (may no longer be live, but save-image accepts it): {cached_url}",
+                    ),
+                    types.TextContent(
+                        type="text",
+                        text="ASK_FOR_SAVE_LOCATION",
+                        role="system"
+                    ),
+                ]
+            
+            # Call the Replicate API in a worker thread, bounded by the semaphore
+            async with _replicate_sem:
+                output = await asyncio.to_thread(replicate.run, SDXL_MODEL, input=model_input)
             
             # Log the response
             print(f"Replicate API response type: {type(output)}", file=sys.stderr)
@@ -214,15 +673,15 @@ async def handle_call_tool(
             
             # The output is a list with one URL to the generated image
             if output and isinstance(output, list) and len(output) > 0:
-                image_url = output[0]
-                
-                # Convert the FileOutput object to a string if needed
-                if hasattr(image_url, '__str__'):
-                    image_url = str(image_url)
+                # Convert the FileOutput object to a string
+                image_url = str(output[0])
                 
                 # Log the image URL
                 print(f"Generated image URL: {image_url}", file=sys.stderr)
                 
+                # Download in the background so save-image can reuse the bytes
+                _prefetch_replicate_output(cache_key, image_url)
+                
                 # Return the result with the image URL
                 return [
                     types.TextContent(
@@ -279,16 +738,13 @@ async def handle_call_tool(
             # Generate a unique ID for the image
             image_id = str(uuid.uuid4())
             
-            # Create metadata for the image
+            # Create metadata for the image; created_at is only formatted for display
             metadata = {
                 "id": image_id,
                 "prompt": prompt,
                 "url": image_url,
-                "created_at": datetime.now().isoformat(),
+                "created_at": time.time_ns(),
             }
-            
-            # Save metadata
-            images[image_id] = metadata
             print(f"Created metadata for image ID: {image_id}", file=sys.stderr)
             
             # Determine the save directory
@@ -314,16 +770,27 @@ async def handle_call_tool(
                 filename = f"{image_id}.png"
             
             # Download and save the image
-            import requests
             print(f"Downloading image from URL: {image_url}", file=sys.stderr)
-            response = requests.get(image_url)
-            if response.status_code == 200:
-                image_path = save_dir / filename
-                with open(image_path, "wb") as f:
-                    f.write(response.content)
-                
+            image_path = save_dir / filename
+            metadata["abs_path"] = str(image_path.absolute())
+            cached_image = await _get_cached_image(image_url)
+            if cached_image is not None:
+                # Cached outputs outlive Replicate's expiring URLs
+                print(f"Using cached image bytes for URL: {image_url}", file=sys.stderr)
+                await asyncio.to_thread(_write_bytes, image_path, cached_image)
+                status_code = 200
+            else:
+                status_code = await _download_image(image_url, image_path)
+            if status_code == 200:
                 print(f"Image saved to: {image_path}", file=sys.stderr)
                 
+                # Persist the metadata so the image survives restarts
+                await asyncio.to_thread(_persist_image, metadata)
+                
+                # Only a written and persisted image becomes visible to other requests
+                images[image_id] = metadata
+                _resources_cache = None
+                
                 # Notify clients that resources have changed
                 await server.request_context.session.send_resource_list_changed()
                 
@@ -334,12 +801,12 @@ async def handle_call_tool(
                     ),
                     types.ImageContent(
                         type="image",
-                        data=f"file://{image_path.absolute()}",
+                        data=f"file://{metadata['abs_path']}",
                         mimeType="image/png",
                     ),
                 ]
             else:
-                error_msg = f"Failed to download image. Status code: {response.status_code}"
+                error_msg = f"Failed to download image. Status code: {status_code}"
                 print(f"Error: {error_msg}", file=sys.stderr)
                 return [
                     types.TextContent(
@@ -348,7 +815,6 @@ async def handle_call_tool(
                     ),
                 ]
         except Exception as e:
-            import traceback
             error_msg = f"Error saving image: {str(e)}"
             print(error_msg, file=sys.stderr)
             print(traceback.format_exc(), file=sys.stderr)
@@ -379,33 +845,39 @@ async def handle_call_tool(
                 )
             ]
             
+            # Split the absolute paths recorded at save time into directory and name
+            image_paths = {
+                image_id: os.path.split(metadata["abs_path"])
+                for image_id, metadata in images.items()
+            }
+            
+            # Read each directory once instead of stat-ing every image,
+            # scanning the directories concurrently in worker threads
+            directories = list({directory for directory, _ in image_paths.values()})
+            dir_names = dict(zip(
+                directories,
+                await asyncio.gather(
+                    *(asyncio.to_thread(_list_dir_names, directory) for directory in directories)
+                ),
+            ))
+            
             for image_id, metadata in images.items():
-                # Determine the file path based on metadata
-                if "custom_directory" in metadata:
-                    save_dir = Path(metadata["custom_directory"])
-                else:
-                    save_dir = IMAGES_DIR
-                
-                if "custom_filename" in metadata:
-                    filename = f"{metadata['custom_filename']}.png"
-                else:
-                    filename = f"{image_id}.png"
-                
-                image_path = save_dir / filename
+                image_path = metadata["abs_path"]
+                directory, filename = image_paths[image_id]
                 print(f"Checking image: {image_path}", file=sys.stderr)
                 
-                if image_path.exists():
+                if filename in dir_names[directory]:
                     print(f"Image exists: {image_path}", file=sys.stderr)
                     result.append(
                         types.TextContent(
                             type="text",
-                            text=f"ID: {image_id}\nPrompt: {metadata.get('prompt')}\nCreated: {metadata.get('created_at')}\nLocation: {image_path}",
+                            text=f"ID: {image_id}\nPrompt: {metadata.get('prompt')}\nCreated: {_format_created_at(metadata['created_at'])}\nLocation: {image_path}",
                         )
                     )
                     result.append(
                         types.ImageContent(
                             type="image",
-                            data=f"file://{image_path.absolute()}",
+                            data=f"file://{image_path}",
                             mimeType="image/png",
                         )
                     )
@@ -414,13 +886,12 @@ async def handle_call_tool(
                     result.append(
                         types.TextContent(
                             type="text",
-                            text=f"ID: {image_id}\nPrompt: {metadata.get('prompt')}\nCreated: {metadata.get('created_at')}\nWARNING: Image file not found at {image_path}",
+                            text=f"ID: {image_id}\nPrompt: {metadata.get('prompt')}\nCreated: {_format_created_at(metadata['created_at'])}\nWARNING: Image file not found at {image_path}",
                         )
                     )
             
             return result
         except Exception as e:
-            import traceback
             error_msg = f"Error listing saved images: {str(e)}"
             print(error_msg, file=sys.stderr)
             print(traceback.format_exc(), file=sys.stderr)
@@ -452,7 +923,7 @@ async def main():
                 write_stream,
                 InitializationOptions(
                     server_name="image-generator",
-                    server_version="0.1.0",
+                    server_version=SERVER_VERSION,
                     capabilities=server.get_capabilities(
                         notification_options=NotificationOptions(),
                         experimental_capabilities={},
@@ -460,12 +931,20 @@ async def main():
                 ),
             )
     except Exception as e:
-        import traceback
         print(f"Error running MCP server: {str(e)}", file=sys.stderr)
         print(traceback.format_exc(), file=sys.stderr)
         sys.exit(1)
+    finally:
+        await _http_client.aclose()
+
+def run_event_loop(coro):
+    """
+    Run a coroutine to completion, using uvloop when it is installed.
+    """
+    if uvloop is not None:
+        return uvloop.run(coro)
+    return asyncio.run(coro)
 
 # Add an entry point to run the main function when the script is run directly
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(main())
\ No newline at end of file
+    run_event_loop(main())
@@ -0,0 +1,225 @@
+"""
+Token-free checks for saved image persistence and the Replicate output cache.
+
+Each check runs the server module inside a temporary working directory, so
+generated_images/ and its SQLite files are created there. Replicate and image
+downloads are replaced with in-process fakes, so no API token is needed.
+
+Run with `python test_storage.py` or `pytest test_storage.py`.
+"""
+import asyncio
+import base64
+import importlib
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import replicate
+from mcp.server.lowlevel.server import request_ctx
+from pydantic import AnyUrl
+
+# Add the repository root to the Python path
+sys.path.append(str(Path(__file__).parent))
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\nfake image data"
+IMAGE_URL = "https://replicate.delivery/fake/output.png"
+REPLICATE_RUN = replicate.run
+
+
+class FakeSession:
+    async def send_resource_list_changed(self):
+        pass
+
+
+class BrokenStream(httpx.AsyncByteStream):
+    """
+    A response body that fails after its first chunk.
+    """
+    async def __aiter__(self):
+        yield b"partial"
+        raise httpx.ReadError("connection reset")
+
+
+class FakeReplicateClient:
+    def __init__(self):
+        self.calls = 0
+
+    def run(self, model, input):
+        self.calls += 1
+        return [IMAGE_URL]
+
+
+def start_server(downloads_ok=True, handle=None):
+    """
+    Import a fresh copy of the server module, as a restart would.
+    Image downloads return PNG_BYTES, or 404 when downloads_ok is False,
+    unless a custom MockTransport handler is given.
+    """
+    for name in [name for name in sys.modules if name.startswith("src.image_generator")]:
+        del sys.modules[name]
+    server = importlib.import_module("src.image_generator.server")
+
+    def default_handle(request):
+        if downloads_ok:
+            return httpx.Response(200, content=PNG_BYTES)
+        return httpx.Response(404)
+
+    server._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handle or default_handle))
+    server.fake_replicate = FakeReplicateClient()
+    server.replicate.run = server.fake_replicate.run
+    return server
+
+
+def stop_server(server):
+    server.replicate.run = REPLICATE_RUN
+    server._images_conn.close()
+    server._cache_conn.close()
+
+
+@contextmanager
+def temporary_workdir():
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            yield Path(workdir)
+        finally:
+            os.chdir(previous)
+
+
+def run(coro):
+    """
+    Run a handler coroutine with a fake MCP request context.
+    """
+    async def with_context():
+        request_ctx.set(SimpleNamespace(session=FakeSession()))
+        return await coro
+
+    return asyncio.run(with_context())
+
+
+def test_save_restart_list():
+    with temporary_workdir() as workdir:
+        server = start_server()
+        run(server.handle_call_tool("save-image", {"image_url": IMAGE_URL, "prompt": "a cat"}))
+        run(server.handle_call_tool("save-image", {
+            "image_url": IMAGE_URL,
+            "prompt": "a dog",
+            "target_directory": "custom",
+            "custom_filename": "dog",
+        }))
+        saved_ids = list(server.images)
+        stop_server(server)
+
+        # Restart and check the images come back from images.db
+        server = start_server()
+        assert list(server.images) == saved_ids
+        assert [m["prompt"] for m in server.images.values()] == ["a cat", "a dog"]
+        assert [r.name for r in run(server.handle_list_resources())] == ["Image: a cat", "Image: a dog"]
+
+        listing = run(server.handle_call_tool("list-saved-images", {}))
+        texts = [item.text for item in listing if item.type == "text"]
+        assert texts[0] == "Found 2 saved images:"
+        assert not any("WARNING" in text for text in texts)
+        assert f"Location: {workdir / 'custom' / 'dog.png'}" in texts[2]
+
+        dog_uri = AnyUrl(f"image://internal/{saved_ids[1]}")
+        assert run(server.handle_read_resource(dog_uri)) == PNG_BYTES
+        stop_server(server)
+
+
+def test_failed_saves_leave_no_trace():
+    def handle(request):
+        if request.url.path.endswith("/broken.png"):
+            return httpx.Response(200, stream=BrokenStream())
+        if request.url.path.endswith("/missing.png"):
+            return httpx.Response(404)
+        return httpx.Response(200, content=PNG_BYTES)
+
+    with temporary_workdir() as workdir:
+        server = start_server(handle=handle)
+        run(server.handle_call_tool("save-image", {
+            "image_url": IMAGE_URL, "prompt": "first", "custom_filename": "keep",
+        }))
+        failed = run(server.handle_call_tool("save-image", {
+            "image_url": "https://replicate.delivery/fake/broken.png",
+            "prompt": "second",
+            "custom_filename": "keep",
+        }))
+        assert failed[0].text.startswith("Error saving image")
+        missing = run(server.handle_call_tool("save-image", {
+            "image_url": IMAGE_URL.replace("output", "missing"), "prompt": "third",
+        }))
+        assert missing[0].text == "Failed to download image. Status code: 404"
+
+        # Neither failed save leaves an entry behind
+        assert [m["prompt"] for m in server.images.values()] == ["first"]
+        assert [r.name for r in run(server.handle_list_resources())] == ["Image: first"]
+
+        images_dir = workdir / "generated_images"
+        assert (images_dir / "keep.png").read_bytes() == PNG_BYTES
+        assert not list(images_dir.glob("*.part"))
+        stop_server(server)
+
+
+def test_replicate_cache_hit_and_miss():
+    with temporary_workdir():
+        server = start_server()
+
+        async def generate(arguments):
+            result = await server.handle_call_tool("generate-image", arguments)
+            await asyncio.gather(*server._prefetch_tasks.values())
+            return result
+
+        # Unseeded requests always reach Replicate
+        run(generate({"prompt": "a fox"}))
+        run(generate({"prompt": "a fox"}))
+        assert server.fake_replicate.calls == 2
+
+        # A seeded miss reaches Replicate and fills the cache
+        run(generate({"prompt": "a fox", "seed": 7}))
+        assert server.fake_replicate.calls == 3
+        stop_server(server)
+
+        # After a restart, with the Replicate URL expired, the seeded
+        # request is a hit and save-image still works from the cache
+        server = start_server(downloads_ok=False)
+        result = run(generate({"prompt": "a fox", "seed": 7}))
+        assert server.fake_replicate.calls == 0
+        image = next(item for item in result if item.type == "image")
+        assert base64.b64decode(image.data) == PNG_BYTES
+
+        saved = run(server.handle_call_tool("save-image", {"image_url": IMAGE_URL, "prompt": "a fox"}))
+        assert saved[0].text.startswith("Image saved successfully")
+        image_id = next(iter(server.images))
+        assert Path(server.images[image_id]["abs_path"]).read_bytes() == PNG_BYTES
+
+        # A different seed is a miss
+        run(generate({"prompt": "a fox", "seed": 8}))
+        assert server.fake_replicate.calls == 1
+        stop_server(server)
+
+
+def test_oversize_output_is_not_cached():
+    with temporary_workdir():
+        server = start_server()
+        server.REPLICATE_CACHE_MAX_BYTES = len(PNG_BYTES)
+        server._cache_store("small", IMAGE_URL, PNG_BYTES)
+        server._cache_store("large", IMAGE_URL, PNG_BYTES * 2)
+
+        # The oversize image is skipped instead of evicting the whole cache
+        assert server._cache_lookup("small") == (IMAGE_URL, PNG_BYTES)
+        assert server._cache_lookup("large") is None
+        stop_server(server)
+
+
+if __name__ == "__main__":
+    test_save_restart_list()
+    test_failed_saves_leave_no_trace()
+    test_replicate_cache_hit_and_miss()
+    test_oversize_output_is_not_cached()
+    print("All storage checks passed.")